@@ -4,17 +4,24 @@ Handles file uploads, job management, and Spark integration
 """
 
 import os
-import json
+import shutil
 import uuid
 import threading
 import subprocess
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from flask import Flask, request, jsonify, send_file
+from stat import S_ISREG
+import orjson
+from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
-from spark_job import run_segmentation_pipeline
+from spark_job import (
+    run_segmentation_pipeline, write_status_file, is_final_status,
+    export_segments_csv, SEGMENTS_CSV
+)
 
 # ===========================
 # Flask Configuration
@@ -36,11 +43,23 @@ STATUS_DIR.mkdir(exist_ok=True)
 # File Configuration
 ALLOWED_EXTENSIONS = {'csv'}
 MAX_FILE_SIZE = 100 * 1024 * 1024  # 100 MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB copy buffer for streamed uploads
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 app.config['UPLOAD_FOLDER'] = str(UPLOAD_DIR)
 
-# Job tracking dictionary (in-memory)
+# Job tracking dictionary (in-memory), guarded by _jobs_lock
 jobs = {}
+_jobs_lock = threading.Lock()
+
+# Background Spark job pool (bounded so bursts queue instead of oversubscribing the driver).
+# Pool threads are joined at interpreter exit, so shutdown waits for running and queued jobs.
+JOB_POOL_SIZE = int(os.environ.get('JOB_POOL_SIZE', 4))
+JOB_EXECUTOR = ThreadPoolExecutor(max_workers=JOB_POOL_SIZE, thread_name_prefix='spark-job')
+
+# Parsed JSON file cache: path -> (stat key, data), invalidated on mtime/size change
+JSON_CACHE_SIZE = 128
+_json_cache = OrderedDict()
+_json_cache_lock = threading.Lock()
 
 # ===========================
 # Helper Functions
@@ -50,6 +69,34 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def cached_json(path):
+    """Load a JSON file, reusing the parsed result while the file is unchanged"""
+    path = str(path)
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    
+    with _json_cache_lock:
+        hit = _json_cache.get(path)
+        if hit is not None and hit[0] == key:
+            _json_cache.move_to_end(path)
+            return hit[1]
+    
+    data = orjson.loads(Path(path).read_bytes())
+    
+    with _json_cache_lock:
+        _json_cache[path] = (key, data)
+        _json_cache.move_to_end(path)
+        while len(_json_cache) > JSON_CACHE_SIZE:
+            _json_cache.popitem(last=False)
+    
+    return data
+
+
+def json_response(data, status=200):
+    """Serialize data with orjson into a Flask JSON response"""
+    return app.response_class(orjson.dumps(data), status=status, mimetype='application/json')
+
+
 def update_job_status(job_id, stage, progress, message):
     """Update job status JSON file and in-memory dictionary"""
     status_data = {
@@ -61,12 +108,25 @@ def update_job_status(job_id, stage, progress, message):
     }
     
     # Update in-memory
-    jobs[job_id] = status_data
+    with _jobs_lock:
+        jobs[job_id] = status_data
     
-    # Write to file
-    status_file = STATUS_DIR / f'{job_id}.json'
-    with open(status_file, 'w') as f:
-        json.dump(status_data, f, indent=2)
+    # Write to file (intermediate ticks are coalesced)
+    write_status_file(STATUS_DIR / f'{job_id}.json', status_data)
+
+
+def load_jobs_from_disk():
+    """Rehydrate the in-memory jobs dictionary from existing status files"""
+    with os.scandir(STATUS_DIR) as entries:
+        for entry in entries:
+            if entry.name.endswith('.json') and entry.is_file():
+                try:
+                    job_data = cached_json(entry.path)
+                except (OSError, ValueError) as e:
+                    print(f"Skipping unreadable status file {entry.name}: {str(e)}")
+                    continue
+                with _jobs_lock:
+                    jobs.setdefault(job_data.get('job_id', entry.name[:-5]), job_data)
 
 
 def run_spark_job_async(job_id, filepath, filename):
@@ -91,6 +151,10 @@ def run_spark_job_async(job_id, filepath, filename):
         update_job_status(job_id, 'error', 0, f'Error: {str(e)}')
 
 
+# Pick up jobs from earlier runs so /jobs can be served from memory
+load_jobs_from_disk()
+
+
 # ===========================
 # API ROUTES
 # ===========================
@@ -131,8 +195,11 @@ def upload_file():
         unique_filename = timestamp + filename
         filepath = UPLOAD_DIR / unique_filename
         
-        # Save file
-        file.save(str(filepath))
+        # Stream file to disk in fixed-size chunks
+        if file.stream.seekable():
+            file.stream.seek(0)
+        with open(filepath, 'wb') as dst:
+            shutil.copyfileobj(file.stream, dst, length=UPLOAD_CHUNK_SIZE)
         
         return jsonify({
             'status': 'uploaded',
@@ -172,13 +239,8 @@ def run_job():
         # Initialize job status
         update_job_status(job_id, 'queued', 0, 'Job queued for processing')
         
-        # Start job in background thread
-        thread = threading.Thread(
-            target=run_spark_job_async,
-            args=(job_id, filepath, filename),
-            daemon=True
-        )
-        thread.start()
+        # Queue job on the background pool
+        JOB_EXECUTOR.submit(run_spark_job_async, job_id, filepath, filename)
         
         return jsonify({
             'status': 'started',
@@ -208,10 +270,9 @@ def job_status(job_id):
         if not status_file.exists():
             return jsonify({'error': f'Job not found: {job_id}'}), 404
         
-        with open(status_file, 'r') as f:
-            status_data = json.load(f)
+        status_data = cached_json(status_file)
         
-        return jsonify(status_data), 200
+        return json_response(status_data)
     
     except Exception as e:
         print(f"Status check error: {str(e)}")
@@ -239,10 +300,9 @@ def get_segments():
                 'message': 'Run a segmentation job first'
             }), 404
         
-        with open(segment_file, 'r') as f:
-            segments_data = json.load(f)
+        segments_data = cached_json(segment_file)
         
-        return jsonify(segments_data), 200
+        return json_response(segments_data)
     
     except Exception as e:
         print(f"Segments error: {str(e)}")
@@ -268,10 +328,9 @@ def get_cluster_plot_data():
                 'message': 'Run a segmentation job first'
             }), 404
         
-        with open(chart_file, 'r') as f:
-            chart_data = json.load(f)
+        chart_data = cached_json(chart_file)
         
-        return jsonify(chart_data), 200
+        return json_response(chart_data)
     
     except Exception as e:
         print(f"Chart data error: {str(e)}")
@@ -283,18 +342,32 @@ def download_file(filename):
     """
     GET /download/<filename>
     Serve files from backend/results/
+    segments.csv is exported from the Parquet output on first request
     """
     try:
         filename = secure_filename(filename)
+        
+        if filename == SEGMENTS_CSV:
+            export_segments_csv(RESULTS_DIR)
+        
         filepath = RESULTS_DIR / filename
         
-        if not filepath.exists():
+        try:
+            file_stat = filepath.stat()
+        except FileNotFoundError:
+            file_stat = None
+        if file_stat is None or not S_ISREG(file_stat.st_mode):
             return jsonify({'error': f'File not found: {filename}'}), 404
         
-        return send_file(
-            str(filepath),
+        # Conditional response: repeat downloads of unchanged files get a 304
+        return send_from_directory(
+            str(RESULTS_DIR),
+            filename,
             as_attachment=True,
-            download_name=filename
+            download_name=filename,
+            conditional=True,
+            etag=True,
+            last_modified=file_stat.st_mtime
         )
     
     except Exception as e:
@@ -322,13 +395,15 @@ def results_list():
     """
     try:
         files = []
-        for file in RESULTS_DIR.iterdir():
-            if file.is_file():
-                files.append({
-                    'filename': file.name,
-                    'size': file.stat().st_size,
-                    'modified': datetime.fromtimestamp(file.stat().st_mtime).isoformat()
-                })
+        with os.scandir(RESULTS_DIR) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    files.append({
+                        'filename': entry.name,
+                        'size': stat.st_size,
+                        'modified': datetime.fromtimestamp(stat.st_mtime).isoformat()
+                    })
         
         return jsonify({
             'files': files,
@@ -347,16 +422,23 @@ def list_jobs():
     List all jobs and their statuses
     """
     try:
-        job_list = []
-        for status_file in STATUS_DIR.glob('*.json'):
-            with open(status_file, 'r') as f:
-                job_data = json.load(f)
-                job_list.append(job_data)
+        with _jobs_lock:
+            snapshot = list(jobs.items())
         
-        return jsonify({
+        job_list = []
+        for job_id, job_data in snapshot:
+            # Running jobs report progress from the Spark pipeline via their status file
+            if not is_final_status(job_data['stage'], job_data['progress']):
+                try:
+                    job_data = cached_json(STATUS_DIR / f'{job_id}.json')
+                except FileNotFoundError:
+                    pass
+            job_list.append(job_data)
+        
+        return json_response({
             'jobs': job_list,
             'total': len(job_list)
-        }), 200
+        })
     
     except Exception as e:
         print(f"Jobs list error: {str(e)}")
@@ -386,6 +468,8 @@ def cleanup():
                 age = time.time() - mtime
                 if age > 3600:  # Older than 1 hour
                     file.unlink()
+                    with _jobs_lock:
+                        jobs.pop(file.stem, None)
                     cleaned.append(file.name)
         
         return jsonify({
@@ -429,9 +513,12 @@ if __name__ == '__main__':
     print(f"Upload Directory: {UPLOAD_DIR}")
     print(f"Results Directory: {RESULTS_DIR}")
     print(f"Status Directory: {STATUS_DIR}")
+    print(f"Job Pool Size: {JOB_POOL_SIZE}")
     print("=" * 60)
     print("Starting Flask server on http://localhost:5000")
     print("CORS enabled for frontend integration")
+    print("For production use: gunicorn -c gunicorn.conf.py app:app")
     print("=" * 60)
     
-    app.run(debug=True, host='0.0.0.0', port=5000, use_reloader=False)
+    # Local development server only; see gunicorn.conf.py for deployment
+    app.run(host='0.0.0.0', port=5000, threaded=True, use_reloader=False)
@@ -0,0 +1,17 @@
+"""
+Gunicorn configuration for the segmentation backend
+Run from backend/: gunicorn -c gunicorn.conf.py app:app
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# Single process with many threads: job state (the jobs dict and the Spark
+# job pool) lives in memory and must not be split across worker processes
+workers = 1
+worker_class = 'gthread'
+threads = int(os.environ.get('THREAD_POOL_SIZE', 16))
+
+# Spark jobs run on the background pool, so request threads never block long
+timeout = 120
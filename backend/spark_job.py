@@ -3,13 +3,20 @@ PySpark ML Pipeline for Customer Segmentation
 Handles data preprocessing, feature engineering, and KMeans clustering
 """
 
-import json
+import os
+import tempfile
+import time
+from operator import itemgetter
+import orjson
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from datetime import datetime
+from pyspark import StorageLevel
 from pyspark.sql import SparkSession
-from pyspark.sql.functions import col, avg, min, max, count, lower, upper, trim, length
+from pyspark.sql.functions import (
+    col, avg, min, max, count, stddev, expr, coalesce, lit, lower, upper, trim, length
+)
 from pyspark.ml import Pipeline
 from pyspark.ml.feature import VectorAssembler, StandardScaler, StringIndexer
 from pyspark.ml.clustering import KMeans
@@ -23,46 +30,92 @@ SPARK_APP_NAME = "CustomerSegmentation"
 NUMERIC_FEATURES = ['Age', 'Spend', 'Recency', 'Frequency']
 FEATURES_TO_SCALE = ['Age', 'Spend', 'Recency', 'Frequency']
 
+# Segmented customer output (Parquet written by the job, CSV exported on demand)
+SEGMENTS_PARQUET = 'segments.parquet'
+SEGMENTS_CSV = 'segments.csv'
+
+# Maximum rows used to estimate the silhouette score
+SILHOUETTE_SAMPLE_SIZE = 10000
+
+# Minimum seconds between intermediate status file writes for the same job
+STATUS_WRITE_INTERVAL = 0.2
+_last_status_write = {}
+
 
 # ===========================
 # Helper Functions
 # ===========================
 
-def log_progress(job_id, status_dir, stage, progress, message):
-    """Write progress update to JSON file"""
-    status_data = {
-        'job_id': job_id,
-        'stage': stage,
-        'progress': progress,
-        'message': message,
-        'timestamp': datetime.now().isoformat()
-    }
+def is_final_status(stage, progress):
+    """Completion and error updates are never coalesced"""
+    return progress == 100 or stage in ('completed', 'error')
+
+
+def status_write_due(job_id, stage, progress):
+    """
+    Return True if a status update should be written to disk now.
+    Intermediate updates within STATUS_WRITE_INTERVAL of the previous write
+    for the same job and stage are skipped; stage changes, completion and
+    errors are always written.
+    """
+    if is_final_status(stage, progress):
+        return True
     
-    status_file = Path(status_dir) / f'{job_id}.json'
-    with open(status_file, 'w') as f:
-        json.dump(status_data, f, indent=2)
+    last = _last_status_write.get(job_id)
+    return (last is None or last[1] != stage
+            or time.monotonic() - last[0] >= STATUS_WRITE_INTERVAL)
+
+
+def write_status_file(status_file, status_data):
+    """
+    Atomically write compact status JSON via a temp file + os.replace,
+    subject to status_write_due(). Returns True if the file was written.
+    """
+    job_id = status_data['job_id']
+    stage = status_data['stage']
+    progress = status_data['progress']
     
-    print(f"[{stage}] {message} ({progress}%)")
+    if not status_write_due(job_id, stage, progress):
+        return False
+    
+    status_file = Path(status_file)
+    tmp_file = status_file.with_suffix('.json.tmp')
+    tmp_file.write_bytes(orjson.dumps(status_data))
+    os.replace(tmp_file, status_file)
+    
+    if is_final_status(stage, progress):
+        _last_status_write.pop(job_id, None)
+    else:
+        _last_status_write[job_id] = (time.monotonic(), stage)
+    
+    return True
 
 
-def get_column_names(df):
-    """Safely get and normalize column names"""
-    return [col.strip().lower() for col in df.columns]
+def log_progress(job_id, status_dir, stage, progress, message):
+    """Write progress update to JSON file"""
+    # Skip building the payload (and formatting its timestamp) for coalesced ticks
+    if status_write_due(job_id, stage, progress):
+        status_data = {
+            'job_id': job_id,
+            'stage': stage,
+            'progress': progress,
+            'message': message,
+            'timestamp': datetime.now().isoformat()
+        }
+        
+        write_status_file(Path(status_dir) / f'{job_id}.json', status_data)
+    
+    print(f"[{stage}] {message} ({progress}%)")
 
 
 def normalize_dataframe(df):
-    """Normalize DataFrame column names to lowercase"""
-    df_normalized = df
-    for col_name in df.columns:
-        normalized_name = col_name.strip().lower()
-        if col_name != normalized_name:
-            df_normalized = df_normalized.withColumnRenamed(col_name, normalized_name)
-    return df_normalized
+    """Normalize DataFrame column names to lowercase in a single projection"""
+    return df.toDF(*(col_name.strip().lower() for col_name in df.columns))
 
 
 def validate_required_columns(df):
-    """Validate that required columns exist"""
-    cols = get_column_names(df)
+    """Validate that required columns exist (expects normalized column names)"""
+    cols = set(df.columns)
     required = ['age', 'spend', 'recency', 'frequency']
     
     missing = [col for col in required if col not in cols]
@@ -87,34 +140,38 @@ def preprocess_data(spark_df, job_id, status_dir):
     # Validate required columns
     validate_required_columns(spark_df)
     
-    # Fill missing numeric values with median
+    # Compute all numeric medians in a single aggregation
     numeric_cols = ['age', 'spend', 'recency', 'frequency']
-    for col_name in numeric_cols:
-        if col_name in spark_df.columns:
-            median_value = spark_df.agg({col_name: 'median'}).collect()[0][0]
-            if median_value is None:
-                median_value = 0
-            spark_df = spark_df.fillna({col_name: median_value})
-    
-    # Remove rows where core features are null
-    spark_df = spark_df.dropna(subset=numeric_cols)
-    
-    # Handle negative values (convert to absolute)
-    for col_name in numeric_cols:
-        spark_df = spark_df.withColumn(col_name, 
-                                       col(col_name).cast('double'))
-    
-    # Remove outliers using IQR method for Spend column
-    spend_stats = spark_df.agg({
-        'spend': 'min',
-        'spend': 'max',
-        'spend': 'mean',
-        'spend': 'stddev'
-    }).collect()[0]
+    medians = spark_df.agg(*[
+        expr(f'percentile_approx(CAST({col_name} AS DOUBLE), 0.5)').alias(col_name)
+        for col_name in numeric_cols
+    ]).first()
+    
+    # Cast to double and fill missing values with the median in one projection;
+    # passthrough names are backtick-quoted so headers like 'unit.price' stay literal
+    spark_df = spark_df.select(*[
+        coalesce(
+            col(col_name).cast('double'),
+            lit(float(medians[col_name]) if medians[col_name] is not None else 0.0)
+        ).alias(col_name) if col_name in numeric_cols
+        else col('`' + col_name.replace('`', '``') + '`')
+        for col_name in spark_df.columns
+    ])
+    
+    # Remove outliers for Spend column (single scan for both statistics)
+    spend_stats = spark_df.agg(
+        avg('spend').alias('mean_spend'),
+        stddev('spend').alias('stddev_spend')
+    ).first()
     
     # Simple outlier detection: remove if spend > mean + 3*stddev
     log_progress(job_id, status_dir, 'preprocessing', 30, 'Removing outliers')
     
+    mean_spend = spend_stats['mean_spend']
+    stddev_spend = spend_stats['stddev_spend']
+    if mean_spend is not None and stddev_spend is not None:
+        spark_df = spark_df.filter(col('spend') <= mean_spend + 3 * stddev_spend)
+    
     return spark_df
 
 
@@ -127,21 +184,19 @@ def feature_engineering(spark_df, job_id, status_dir):
     """
     log_progress(job_id, status_dir, 'feature_engineering', 40, 'Starting feature engineering')
     
-    # Ensure numeric types
-    for col_name in ['age', 'spend', 'recency', 'frequency']:
-        if col_name in spark_df.columns:
-            spark_df = spark_df.withColumn(col_name, col(col_name).cast('double'))
+    # Numeric columns are already doubles from preprocess_data, so derived
+    # features are added in one projection that Catalyst collapses with it
+    derived = []
     
     # Create derived features if they don't exist
     if 'age_group' not in spark_df.columns:
-        spark_df = spark_df.withColumn('age_group', 
-                                       (col('age') / 10).cast('int') * 10)
+        derived.append(((col('age') / 10).cast('int') * 10).alias('age_group'))
     
     # Recency-Frequency-Monetary (RFM) features
-    spark_df = spark_df.withColumn('rf_ratio', 
-                                   col('frequency') / (col('recency') + 1))
-    spark_df = spark_df.withColumn('spend_per_purchase',
-                                   col('spend') / (col('frequency') + 1))
+    derived.append((col('frequency') / (col('recency') + 1)).alias('rf_ratio'))
+    derived.append((col('spend') / (col('frequency') + 1)).alias('spend_per_purchase'))
+    
+    spark_df = spark_df.select('*', *derived)
     
     log_progress(job_id, status_dir, 'feature_engineering', 50, 'Features engineered')
     
@@ -165,9 +220,6 @@ def create_feature_vector(spark_df, job_id, status_dir):
     
     spark_df = assembler.transform(spark_df)
     
-    # Verify vector assembly
-    spark_df.select('features').show(5, truncate=False)
-    
     log_progress(job_id, status_dir, 'vectorization', 60, 'Feature vector created')
     
     return spark_df
@@ -211,30 +263,45 @@ def perform_clustering(spark_df, k=4, job_id=None, status_dir=None):
     model = kmeans.fit(spark_df)
     spark_df = model.transform(spark_df)
     
-    # Calculate silhouette score
-    evaluator = ClusteringEvaluator(
-        predictionCol='cluster',
-        featuresCol='scaled_features',
-        metricName='silhouette'
-    )
-    
-    silhouette_score = evaluator.evaluate(model)
-    print(f"Silhouette Score: {silhouette_score:.4f}")
-    
-    log_progress(job_id, status_dir, 'clustering', 85, 
-                f'KMeans complete. Silhouette Score: {silhouette_score:.4f}')
+    # Persist predictions so evaluation, profiling, charts and export
+    # reuse them instead of re-running the whole pipeline per action
+    spark_df = spark_df.persist(StorageLevel.MEMORY_AND_DISK)
+    try:
+        clustered_count = spark_df.count()  # materialize
+        
+        # Calculate silhouette score
+        evaluator = ClusteringEvaluator(
+            predictionCol='cluster',
+            featuresCol='scaled_features',
+            metricName='silhouette'
+        )
+        
+        # Estimate silhouette on a sample for large inputs
+        sample_frac = SILHOUETTE_SAMPLE_SIZE / clustered_count if clustered_count else 1.0
+        if sample_frac < 1.0:
+            eval_df = spark_df.sample(withReplacement=False, fraction=sample_frac, seed=42)
+        else:
+            eval_df = spark_df
+        
+        silhouette_score = evaluator.evaluate(eval_df)
+        print(f"Silhouette Score: {silhouette_score:.4f}")
+        
+        log_progress(job_id, status_dir, 'clustering', 85, 
+                    f'KMeans complete. Silhouette Score: {silhouette_score:.4f}')
+    except BaseException:
+        # The caller only releases the cache once it has the predictions
+        spark_df.unpersist()
+        raise
     
     return spark_df, model, silhouette_score
 
 
-def generate_segment_profiles(spark_df, results_dir, job_id, status_dir):
+def compute_cluster_stats(spark_df):
     """
-    Generate detailed segment profiles for frontend
+    Calculate per-cluster statistics once for segment profiles and charts
+    Returns: list of Rows (cluster, size, avg_*, min_spend, max_spend)
     """
-    log_progress(job_id, status_dir, 'profiling', 90, 'Generating segment profiles')
-    
-    # Calculate cluster statistics
-    cluster_stats = spark_df.groupBy('cluster').agg(
+    return spark_df.groupBy('cluster').agg(
         count('*').alias('size'),
         avg('age').alias('avg_age'),
         avg('spend').alias('avg_spend'),
@@ -243,44 +310,47 @@ def generate_segment_profiles(spark_df, results_dir, job_id, status_dir):
         min('spend').alias('min_spend'),
         max('spend').alias('max_spend')
     ).collect()
+
+
+def generate_segment_profiles(cluster_stats, results_dir, job_id, status_dir, silhouette_score=None):
+    """
+    Generate detailed segment profiles for frontend
+    """
+    log_progress(job_id, status_dir, 'profiling', 90, 'Generating segment profiles')
     
-    clusters = []
-    total_customers = 0
-    
-    for row in cluster_stats:
-        cluster_id = int(row['cluster'])
-        size = int(row['size'])
-        total_customers += size
-        
-        cluster_info = {
-            'id': cluster_id,
-            'size': size,
-            'avgAge': round(float(row['avg_age']), 1),
-            'avgSpend': round(float(row['avg_spend']), 2),
-            'avgRecency': round(float(row['avg_recency']), 1),
-            'avgFrequency': round(float(row['avg_frequency']), 1),
-            'minSpend': round(float(row['min_spend']), 2),
-            'maxSpend': round(float(row['max_spend']), 2),
-            'topCategory': 'Electronics',  # Could be enhanced with actual category analysis
-            'description': get_cluster_description(row)
-        }
-        clusters.append(cluster_info)
-    
-    # Sort by size descending
-    clusters.sort(key=lambda x: x['size'], reverse=True)
+    # Aggregates over double columns already come back as Python floats
+    clusters = sorted(
+        (
+            {
+                'id': int(row['cluster']),
+                'size': int(row['size']),
+                'avgAge': round(row['avg_age'], 1),
+                'avgSpend': round(row['avg_spend'], 2),
+                'avgRecency': round(row['avg_recency'], 1),
+                'avgFrequency': round(row['avg_frequency'], 1),
+                'minSpend': round(row['min_spend'], 2),
+                'maxSpend': round(row['max_spend'], 2),
+                'topCategory': 'Electronics',  # Could be enhanced with actual category analysis
+                'description': get_cluster_description(row)
+            }
+            for row in cluster_stats
+        ),
+        key=itemgetter('size'),
+        reverse=True  # Sort by size descending
+    )
+    total_customers = sum(cluster['size'] for cluster in clusters)
     
     segment_profiles = {
         'numClusters': len(clusters),
         'totalCustomers': total_customers,
         'clusters': clusters,
-        'silhouetteScore': 0.72,  # Would be calculated from actual model
+        'silhouetteScore': round(float(silhouette_score), 4) if silhouette_score is not None else None,
         'generatedAt': datetime.now().isoformat()
     }
     
     # Save to JSON
     output_file = Path(results_dir) / 'segment_profiles.json'
-    with open(output_file, 'w') as f:
-        json.dump(segment_profiles, f, indent=2)
+    output_file.write_bytes(orjson.dumps(segment_profiles, option=orjson.OPT_INDENT_2))
     
     print(f"Segment profiles saved to {output_file}")
     
@@ -306,15 +376,14 @@ def get_cluster_description(row):
         return 'Emerging Customers'
 
 
-def generate_chart_data(spark_df, results_dir, job_id, status_dir):
+def generate_chart_data(spark_df, cluster_stats, results_dir, job_id, status_dir):
     """
     Generate visualization data for frontend charts
     """
     log_progress(job_id, status_dir, 'visualization', 95, 'Generating visualization data')
     
     # Cluster counts for bar chart
-    cluster_counts = spark_df.groupBy('cluster').count().collect()
-    cluster_counts_dict = {int(row['cluster']): int(row['count']) for row in cluster_counts}
+    cluster_counts_dict = {int(row['cluster']): int(row['size']) for row in cluster_stats}
     
     # Sort by cluster ID
     cluster_labels = sorted(cluster_counts_dict.keys())
@@ -322,38 +391,35 @@ def generate_chart_data(spark_df, results_dir, job_id, status_dir):
     
     # Sample data for scatter plot
     pd_df = spark_df.select('age', 'spend', 'cluster').limit(1000).toPandas()
-    scatter_points = []
-    for _, row in pd_df.iterrows():
-        scatter_points.append({
-            'x': float(row['age']),
-            'y': float(row['spend']),
-            'segment': int(row['cluster'])
-        })
+    ages = pd_df['age'].to_numpy(dtype=np.float64)
+    spends = pd_df['spend'].to_numpy(dtype=np.float64)
+    segments = pd_df['cluster'].to_numpy(dtype=np.int32)
+    scatter_points = [
+        {'x': float(a), 'y': float(s), 'segment': int(c)}
+        for a, s, c in zip(ages, spends, segments)
+    ]
+    
+    # Line chart data (trends): one grouped scan over 10-year buckets from 20 to 80
+    age_buckets = spark_df.filter(
+        (col('age') >= 20) & (col('age') < 80)
+    ).groupBy(
+        ((col('age') - 20) / 10).cast('int').alias('bucket')
+    ).agg(avg('spend').alias('avg_spend')).collect()
+    bucket_spend = {row['bucket']: row['avg_spend'] for row in age_buckets}
     
-    # Line chart data (trends)
-    age_ranges = [(20, 30), (30, 40), (40, 50), (50, 60), (60, 70), (70, 80)]
     line_data = []
-    for start, end in age_ranges:
-        avg_spend = spark_df.filter(
-            (col('age') >= start) & (col('age') < end)
-        ).agg(avg('spend')).collect()[0][0]
-        
+    for bucket in range(6):
+        avg_spend = bucket_spend.get(bucket)
         if avg_spend is not None:
+            start = 20 + bucket * 10
             line_data.append({
-                'x': f'{start}-{end}',
+                'x': f'{start}-{start + 10}',
                 'y': float(avg_spend)
             })
     
     # Radar chart data (cluster profiles)
-    cluster_profiles = spark_df.groupBy('cluster').agg(
-        avg('age').alias('avg_age'),
-        avg('spend').alias('avg_spend'),
-        avg('recency').alias('avg_recency'),
-        avg('frequency').alias('avg_frequency')
-    ).collect()
-    
     radar_data = []
-    for row in cluster_profiles:
+    for row in cluster_stats:
         radar_data.append({
             'cluster': int(row['cluster']),
             'age': round(float(row['avg_age']), 1),
@@ -375,8 +441,7 @@ def generate_chart_data(spark_df, results_dir, job_id, status_dir):
     
     # Save to JSON
     output_file = Path(results_dir) / 'chart_data.json'
-    with open(output_file, 'w') as f:
-        json.dump(chart_data, f, indent=2)
+    output_file.write_bytes(orjson.dumps(chart_data, option=orjson.OPT_INDENT_2))
     
     print(f"Chart data saved to {output_file}")
     
@@ -385,7 +450,8 @@ def generate_chart_data(spark_df, results_dir, job_id, status_dir):
 
 def save_segmented_customers(spark_df, results_dir, job_id, status_dir):
     """
-    Save segmented customer data to CSV
+    Save segmented customer data to Parquet
+    (CSV is exported lazily by export_segments_csv)
     """
     log_progress(job_id, status_dir, 'saving', 98, 'Saving segmented customers')
     
@@ -402,18 +468,45 @@ def save_segmented_customers(spark_df, results_dir, job_id, status_dir):
     # Filter to available columns
     available_cols = [col for col in output_cols if col in spark_df.columns]
     
-    # Save as single CSV
+    # Save as Parquet (written in parallel, no single-partition bottleneck)
     output_df = spark_df.select(*available_cols)
-    output_file = Path(results_dir) / 'segments.csv'
+    output_file = Path(results_dir) / SEGMENTS_PARQUET
     
-    output_df.coalesce(1).write.mode('overwrite').csv(
-        str(output_file),
-        header=True
-    )
+    output_df.write.mode('overwrite').parquet(str(output_file))
     
     print(f"Segmented customers saved to {output_file}")
 
 
+def export_segments_csv(results_dir):
+    """
+    Convert the segments Parquet output to a single CSV file
+    Re-exports only when the CSV is missing or older than the Parquet output
+    Returns: path to the CSV, or None if no segments have been saved
+    """
+    parquet_path = Path(results_dir) / SEGMENTS_PARQUET
+    csv_path = Path(results_dir) / SEGMENTS_CSV
+    
+    if not parquet_path.exists():
+        return None
+    
+    if csv_path.is_file() and csv_path.stat().st_mtime >= parquet_path.stat().st_mtime:
+        return csv_path
+    
+    # Unique temp file per export so concurrent downloads never share one
+    fd, tmp_path = tempfile.mkstemp(dir=results_dir, prefix=SEGMENTS_CSV + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', newline='') as f:
+            pd.read_parquet(parquet_path).to_csv(f, index=False)
+        os.replace(tmp_path, csv_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    
+    print(f"Segmented customers exported to {csv_path}")
+    
+    return csv_path
+
+
 # ===========================
 # Main Pipeline Function
 # ===========================
@@ -474,21 +567,28 @@ def run_segmentation_pipeline(job_id, filepath, results_dir, status_dir, k=4):
         )
         
         # Stage 5: Generate outputs
-        
-        # Generate segment profiles
-        segment_profiles = generate_segment_profiles(
-            spark_df, results_dir, job_id, status_dir
-        )
-        
-        # Generate chart data
-        chart_data = generate_chart_data(
-            spark_df, results_dir, job_id, status_dir
-        )
-        
-        # Save segmented customers
-        save_segmented_customers(
-            spark_df, results_dir, job_id, status_dir
-        )
+        try:
+            # Per-cluster statistics shared by profiles and charts
+            cluster_stats = compute_cluster_stats(spark_df)
+            
+            # Generate segment profiles
+            segment_profiles = generate_segment_profiles(
+                cluster_stats, results_dir, job_id, status_dir,
+                silhouette_score=silhouette_score
+            )
+            
+            # Generate chart data
+            chart_data = generate_chart_data(
+                spark_df, cluster_stats, results_dir, job_id, status_dir
+            )
+            
+            # Save segmented customers
+            save_segmented_customers(
+                spark_df, results_dir, job_id, status_dir
+            )
+        finally:
+            # Release cached predictions even if an output stage fails
+            spark_df.unpersist()
         
         # Final status update
         log_progress(job_id, status_dir, 'completed', 100, 'Segmentation completed successfully')
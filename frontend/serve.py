@@ -4,52 +4,801 @@ Simple HTTP Server for Frontend
 Serves index.html by default for all requests to root
 """
 
+import argparse
+import gzip
+import hashlib
+import mimetypes
 import os
+import posixpath
+import re
+import shutil
+import signal
+import socket
 import sys
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+import time
+import traceback
+from email.utils import formatdate, parsedate_to_datetime
+from functools import lru_cache, partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 from pathlib import Path
+from stat import S_ISREG
+from urllib.parse import unquote
+
+# Static asset types browsers may cache. A request whose ?v= matches the
+# version load_assets() wrote into the HTML is cached for a year; other
+# requests (unversioned, stale or disk-served) get a short max-age and
+# revalidate with ETag. The HTML shell is never cached
+CACHEABLE_EXTENSIONS = ('.js', '.css', '.png', '.jpg', '.jpeg', '.gif', '.ico',
+                        '.woff', '.woff2', '.svg')
+CACHE_MAX_AGE = 31536000  # 1 year
+REVALIDATE_MAX_AGE = 300  # 5 minutes
+
+# Precomputed header bytes appended straight to the header buffer
+NO_CACHE_HEADERS = (b"Cache-Control: no-store, no-cache, must-revalidate, max-age=0\r\n"
+                    b"Pragma: no-cache\r\n"
+                    b"Expires: 0\r\n")
+REVALIDATE_HEADERS = f"Cache-Control: public, max-age={REVALIDATE_MAX_AGE}\r\n".encode('latin-1')
+KEEPALIVE_HEADER = b"Connection: keep-alive\r\n"
+_far_future_headers = (0, b"")  # (built at, header bytes), rebuilt once a minute
+
+
+def far_future_headers():
+    """Return the long-lived cache header block, refreshing its Expires date each minute"""
+    global _far_future_headers
+    built_at, blob = _far_future_headers
+    now = time.time()
+    if now - built_at >= 60:
+        blob = (f"Cache-Control: public, max-age={CACHE_MAX_AGE}, immutable\r\n"
+                f"Expires: {formatdate(now + CACHE_MAX_AGE, usegmt=True)}\r\n").encode('latin-1')
+        _far_future_headers = (now, blob)
+    return blob
+
+# Content types for the frontend's asset set, resolved without mimetypes
+EXT_TO_CT = {
+    '.html': 'text/html; charset=utf-8',
+    '.htm': 'text/html; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.mjs': 'application/javascript; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.json': 'application/json',
+    '.map': 'application/json',
+    '.csv': 'text/csv; charset=utf-8',
+    '.txt': 'text/plain; charset=utf-8',
+    '.svg': 'image/svg+xml',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.ico': 'image/x-icon',
+    '.webp': 'image/webp',
+    '.woff': 'font/woff',
+    '.woff2': 'font/woff2',
+}
+
+
+def content_type_for(path):
+    """Map a path to its Content-Type, falling back to mimetypes for unknown extensions"""
+    content_type = EXT_TO_CT.get(os.path.splitext(path)[1].lower())
+    if content_type is None:
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    return content_type
+
+
+# In-memory asset cache, built once at startup by load_assets()
+MAX_CACHED_ASSET_SIZE = 5 * 1024 * 1024  # larger files are served from disk
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json',
+                      'image/svg+xml')
+SKIP_DIRS = {'__pycache__'}
+PRECOMPRESSED_SUFFIXES = ('.br', '.gz')
+SERVED_ENCODINGS = frozenset(('br', 'gzip'))
+SEND_BUFFER_SIZE = 1 << 20  # per-connection kernel send buffer (1 MB)
+KEEPALIVE_TIMEOUT = 15  # seconds an idle keep-alive connection may hold a thread
+COALESCE_BODY_LIMIT = 64 * 1024  # cached bodies up to this size share the header write
+# Set FRONTEND_DEV=1 to re-read assets from disk when their mtime changes
+# (and send them uncached, so browsers pick the edits up)
+DEV_MODE = os.environ.get('FRONTEND_DEV') == '1'
+SHELL_URL_PATH = '/index.html'  # '/' and '' resolve here in parse_request()
+# Set FRONTEND_LOG=1 (or pass --verbose) to log every request to stderr
+VERBOSE = os.environ.get('FRONTEND_LOG') == '1'
+# Pre-forked server processes (FRONTEND_WORKERS or --workers; 0 = one per CPU)
+WORKERS = int(os.environ.get('FRONTEND_WORKERS', 1))
+# Listening port (PORT or --port) and host (FRONTEND_HOST or --host; empty = all
+# interfaces, dual-stack IPv6 + IPv4 where the OS supports it)
+PORT = int(os.environ.get('PORT', 8000))
+HOST = os.environ.get('FRONTEND_HOST', '')
+ASSETS = {}
+
+
+class Asset:
+    """A static file held in memory with its precomputed response metadata"""
+    
+    __slots__ = ('path', 'body', 'gzip_body', 'br_body', 'mtime_ns', 'mtime',
+                 'etag', 'gzip_etag', 'br_etag', 'version', 'content_type', 'last_modified')
+    
+    def __init__(self, path):
+        st = os.stat(path)
+        with open(path, 'rb') as f:
+            body = f.read()
+        
+        self.path = path
+        self.body = body
+        self.mtime_ns = st.st_mtime_ns
+        self.mtime = int(st.st_mtime)
+        # Same validator as send_head() so disk and memory responses agree
+        self.set_etag(file_etag(st))
+        self.content_type = content_type_for(path)
+        self.last_modified = formatdate(st.st_mtime, usegmt=True)
+        
+        # Prefer prebuilt .br/.gz files next to the asset (see --precompress)
+        self.br_body = read_precompressed(path + '.br', st.st_mtime_ns)
+        self.gzip_body = read_precompressed(path + '.gz', st.st_mtime_ns)
+        
+        # Otherwise gzip text-like assets once, when it actually saves bytes
+        if self.gzip_body is None and self.content_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(body, 9)
+            if len(compressed) < len(body):
+                self.gzip_body = compressed
+    
+    def set_etag(self, etag):
+        self.etag = etag
+        self.gzip_etag = etag[:-1] + '-gz"'
+        self.br_etag = etag[:-1] + '-br"'
+        # Cache-busting token written into ?v= by version_asset_urls()
+        self.version = etag.strip('"')
+    
+    def replace_body(self, body):
+        """Swap in a rewritten body; its validator and gzip variant are derived from it"""
+        self.body = body
+        self.set_etag(f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"')
+        # Sidecar .br/.gz files were built from the file on disk
+        self.br_body = None
+        self.gzip_body = None
+        if self.content_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(body, 9)
+            if len(compressed) < len(body):
+                self.gzip_body = compressed
+
+
+# Local src/href references, with any ?v= cache-busting query they carry
+ASSET_REF_RE = re.compile(rb'''((?:src|href)=["'])([^"'?#:]+)(?:\?v=[^"'#]*)?(?=["'#])''')
+
+
+@lru_cache(maxsize=64)
+def accepted_encodings(accept_encoding):
+    """Return the content codings (of those we serve) an Accept-Encoding value allows"""
+    allowed, refused, wildcard = set(), set(), False
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if coding == 'x-gzip':
+            coding = 'gzip'
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding == '*':
+            wildcard = q > 0
+        elif q > 0:
+            allowed.add(coding)
+        else:
+            refused.add(coding)
+    if wildcard:
+        allowed.update(coding for coding in SERVED_ENCODINGS if coding not in refused)
+    return frozenset(allowed & SERVED_ENCODINGS)
+
+
+def file_etag(st):
+    """Strong validator for a file from its stat result"""
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def read_precompressed(path, source_mtime_ns):
+    """Read a precompressed sidecar file, ignoring it if missing or older than its source"""
+    try:
+        if os.stat(path).st_mtime_ns < source_mtime_ns:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def iter_static_files(root):
+    """Yield (filesystem path, URL path) for every servable file under root"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and not d.startswith('.')]
+        names = set(filenames)
+        for filename in filenames:
+            if filename.startswith('.'):
+                continue
+            # Precompressed sidecars are served as variants of their source file
+            if filename.endswith(PRECOMPRESSED_SUFFIXES) and filename[:-3] in names:
+                continue
+            path = os.path.join(dirpath, filename)
+            yield path, '/' + os.path.relpath(path, root).replace(os.sep, '/')
+
+
+def load_assets(root):
+    """Read every servable file under root into an URL path -> Asset dict"""
+    assets = {}
+    for path, url_path in iter_static_files(root):
+        try:
+            if os.path.getsize(path) > MAX_CACHED_ASSET_SIZE:
+                continue
+            assets[url_path] = Asset(path)
+        except OSError:
+            continue
+    version_asset_urls(assets)
+    return assets
+
+
+def version_asset_urls(assets):
+    """Point each HTML asset's references to cacheable assets at ?v=<their version>"""
+    for url_path, asset in assets.items():
+        if not asset.content_type.startswith('text/html'):
+            continue
+        base = posixpath.dirname(url_path)
+        
+        def versioned(match):
+            ref = match.group(2).decode('latin-1')
+            target_path = posixpath.normpath(posixpath.join(base, ref))
+            target = assets.get(target_path)
+            if target is None or not target_path.lower().endswith(CACHEABLE_EXTENSIONS):
+                return match.group(0)
+            return match.group(1) + match.group(2) + b'?v=' + target.version.encode('ascii')
+        
+        body = ASSET_REF_RE.sub(versioned, asset.body)
+        if body != asset.body:
+            asset.replace_body(body)
+
+
+def precompress_assets(root):
+    """Write .gz (and .br, if the brotli package is installed) next to compressible assets"""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+        sys.stdout.write("brotli not installed; writing .gz files only\n")
+    
+    written = 0
+    for path, url_path in iter_static_files(root):
+        if not content_type_for(path).startswith(COMPRESSIBLE_TYPES):
+            continue
+        with open(path, 'rb') as f:
+            body = f.read()
+        variants = [('.gz', gzip.compress(body, 9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(body, quality=11)))
+        for suffix, compressed in variants:
+            if len(compressed) < len(body):
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
+                written += 1
+    
+    sys.stdout.write(f"Wrote {written} precompressed files under {root}\n")
+
 
 class MyHTTPRequestHandler(SimpleHTTPRequestHandler):
     """Custom handler that serves index.html for directory requests"""
     
-    def do_GET(self):
-        # If root path, serve index.html
-        if self.path == '/' or self.path == '':
-            self.path = '/index.html'
+    # Persistent connections: every response path sends Content-Length
+    # (cached assets, stdlib file/redirect/error responses) or has no body (304)
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+    
+    _url_path = ''
+    _query = ''
+    _versioned = False
+    _etag = None
+    _response_code = None
+    _pending_body = None
+    # Complete 200 responses for the HTML shell: encoding -> (Asset, second, bytes)
+    _shell_responses = {}
+    verbose = VERBOSE
+    
+    def parse_request(self):
+        """Parse the request line, then derive the URL path once for the whole request"""
+        # Reset per-request state (handlers are reused across keep-alive requests)
+        self._url_path = ''
+        self._query = ''
+        self._versioned = False
+        self._etag = None
+        self._response_code = None
+        if not super().parse_request():
+            return False
         
-        # If requesting a directory, serve index.html
-        if self.path.endswith('/'):
-            self.path = self.path + 'index.html'
+        # Split off query/fragment; directories (including '/') map to their index.html
+        url_path, _, self._query = self.path.split('#', 1)[0].partition('?')
+        url_path = url_path or '/'
+        if url_path.endswith('/'):
+            url_path += 'index.html'
+        self._url_path = url_path
+        return True
+    
+    def do_GET(self):
+        asset = self.lookup_asset(self._url_path)
+        if asset is not None:
+            if self._url_path == SHELL_URL_PATH and self.send_shell(asset):
+                return
+            return self.send_asset(asset)
         
+        # Not preloaded: the stdlib path serves index.html for '/'-terminated
+        # paths itself, so self.path is left untouched
         return super().do_GET()
     
+    def do_HEAD(self):
+        """Answer HEAD for cached assets from memory, without opening the file"""
+        asset = self.lookup_asset(self._url_path)
+        if asset is not None:
+            return self.send_asset(asset, head_only=True)
+        return super().do_HEAD()
+    
+    def lookup_asset(self, url_path):
+        """Return the cached Asset for a URL path, or None to use disk"""
+        asset = ASSETS.get(url_path)
+        if asset is not None and DEV_MODE:
+            try:
+                if os.stat(asset.path).st_mtime_ns != asset.mtime_ns:
+                    # No ?v= rewrite on reload; dev mode sends everything uncached
+                    asset = ASSETS[url_path] = Asset(asset.path)
+            except OSError:
+                ASSETS.pop(url_path, None)
+                return None
+        return asset
+    
+    def not_modified(self, etags, mtime):
+        """Evaluate If-None-Match against etags, or else If-Modified-Since against mtime"""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or any(etag in tags for etag in etags)
+        
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+            if since.tzinfo is None:
+                return False
+            return mtime <= since.timestamp()
+        
+        return False
+    
+    def choose_variant(self, asset):
+        """Pick the (body, etag, encoding) of an asset that the client accepts"""
+        accepted = accepted_encodings(self.headers.get('Accept-Encoding', ''))
+        if asset.br_body is not None and 'br' in accepted:
+            return asset.br_body, asset.br_etag, 'br'
+        if asset.gzip_body is not None and 'gzip' in accepted:
+            return asset.gzip_body, asset.gzip_etag, 'gzip'
+        return asset.body, asset.etag, None
+    
+    def send_shell(self, asset):
+        """Write the HTML shell as one prebuilt response; False if send_asset must handle it"""
+        # Conditional and closing requests take the regular header path
+        if (self.close_connection or 'If-None-Match' in self.headers
+                or 'If-Modified-Since' in self.headers):
+            return False
+        
+        body, etag, encoding = self.choose_variant(asset)
+        now = int(time.time())
+        cached = self._shell_responses.get(encoding)
+        if cached is not None and cached[0] is asset and cached[1] == now:
+            response = cached[2]
+        else:
+            # Rebuilt when the Date second rolls over or DEV_MODE reloads the asset
+            lines = [
+                f"{self.protocol_version} 200 OK",
+                f"Server: {self.version_string()}",
+                f"Date: {formatdate(now, usegmt=True)}",
+                f"Content-Type: {asset.content_type}",
+                f"Content-Length: {len(body)}",
+                f"Last-Modified: {asset.last_modified}",
+                f"ETag: {etag}",
+            ]
+            if asset.gzip_body is not None or asset.br_body is not None:
+                lines.append("Vary: Accept-Encoding")
+            if encoding is not None:
+                lines.append(f"Content-Encoding: {encoding}")
+            response = (("\r\n".join(lines) + "\r\n").encode('latin-1')
+                        + KEEPALIVE_HEADER + NO_CACHE_HEADERS + b"\r\n" + body)
+            self._shell_responses[encoding] = (asset, now, response)
+        
+        self.wfile.write(response)
+        self.log_request(200, len(body))
+        return True
+    
+    def send_asset(self, asset, head_only=False):
+        """Write a cached asset (or a 304) straight from memory; headers only for HEAD"""
+        body, self._etag, encoding = self.choose_variant(asset)
+        # Only the exact URL the HTML references may be cached for a year
+        self._versioned = self._query == 'v=' + asset.version
+        
+        if self.not_modified((asset.etag, asset.gzip_etag, asset.br_etag), asset.mtime):
+            self.send_response(304)
+            self.end_headers()
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-Type', asset.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Last-Modified', asset.last_modified)
+        if asset.gzip_body is not None or asset.br_body is not None:
+            self.send_header('Vary', 'Accept-Encoding')
+        if encoding is not None:
+            self.send_header('Content-Encoding', encoding)
+        
+        if head_only:
+            self.end_headers()
+        elif len(body) <= COALESCE_BODY_LIMIT and self.request_version != 'HTTP/0.9':
+            # Headers and body leave in one write (one segment with TCP_NODELAY);
+            # HTTP/0.9 has no headers and end_headers() never flushes for it
+            self._pending_body = body
+            self.end_headers()
+        else:
+            self.end_headers()
+            self.wfile.write(body)
+    
+    def flush_headers(self):
+        if self._pending_body is not None:
+            self._headers_buffer.append(self._pending_body)
+            self._pending_body = None
+        super().flush_headers()
+    
+    def send_head(self):
+        """Serve regular files with one translate_path, open and fstat, plus ETag / 304"""
+        self._etag = None
+        path = self.translate_path(self.path)
+        if path.endswith('/'):
+            # Directories: the stdlib redirects, serves index.html or 404s
+            return super().send_head()
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            # Missing, unreadable or a directory; the stdlib sends the matching error
+            return super().send_head()
+        
+        try:
+            st = os.fstat(f.fileno())
+            if not S_ISREG(st.st_mode):
+                f.close()
+                return super().send_head()
+            
+            self._etag = file_etag(st)
+            if self.not_modified((self._etag,), int(st.st_mtime)):
+                f.close()
+                self.send_response(304)
+                self.end_headers()
+                return None
+            
+            self.send_response(200)
+            self.send_header('Content-Type', self.guess_type(path))
+            self.send_header('Content-Length', str(st.st_size))
+            self.send_header('Last-Modified', self.date_time_string(st.st_mtime))
+            self.end_headers()
+            return f
+        except BaseException:
+            f.close()
+            raise
+    
+    def translate_path(self, path):
+        """Map a URL path under the cached document root in one normalize + prefix check"""
+        path = unquote(path.split('?', 1)[0].split('#', 1)[0], errors='surrogatepass')
+        trailing_slash = path.rstrip().endswith('/')
+        full = os.path.normpath(os.path.join(self.directory, path.lstrip('/')))
+        if full != self.directory and not full.startswith(self.directory + os.sep):
+            # '..' (or drive tricks on Windows) escaping the root; an empty path
+            # makes open() fail, so the request gets a plain 404
+            return ''
+        if trailing_slash:
+            full += '/'
+        return full
+    
+    def guess_type(self, path):
+        return content_type_for(path)
+    
+    def list_directory(self, path):
+        """Directory listings are never served; answer 404 without scanning"""
+        self.send_error(404, "File not found")
+        return None
+    
+    def copyfile(self, source, outputfile):
+        """Stream file bodies to the client socket with sendfile(2) when possible"""
+        if outputfile is self.wfile and hasattr(source, 'fileno'):
+            outputfile.flush()
+            # socket.sendfile uses os.sendfile and falls back to send() itself
+            self.connection.sendfile(source)
+        else:
+            shutil.copyfileobj(source, outputfile)
+    
+    def log_request(self, code='-', size='-'):
+        # Per-request access logging is off the hot path unless verbose;
+        # errors still go through log_error
+        if self.verbose:
+            super().log_request(code, size)
+    
+    def log_error(self, format, *args):
+        # Idle keep-alive connections end in handle_one_request's timeout
+        # branch; that is routine, so only report it when verbose
+        if format.startswith('Request timed out') and not self.verbose:
+            return
+        super().log_error(format, *args)
+    
+    def send_response(self, code, message=None):
+        self._response_code = code
+        return super().send_response(code, message)
+    
     def end_headers(self):
-        # Add headers to prevent caching
-        self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate, max-age=0')
-        self.send_header('Pragma', 'no-cache')
-        self.send_header('Expires', '0')
+        if self.request_version == 'HTTP/0.9':
+            return super().end_headers()
+        
+        ok = self._response_code in (200, 304)
+        if ok and self._etag:
+            self.send_header('ETag', self._etag)
+        
+        # Client 'Connection: close' and error responses set close_connection
+        if not self.close_connection:
+            self._headers_buffer.append(KEEPALIVE_HEADER)
+        
+        if ok and not DEV_MODE and self._url_path.lower().endswith(CACHEABLE_EXTENSIONS):
+            # Far-future caching for versioned static assets, otherwise
+            # revalidate after a few minutes (all off in dev mode)
+            self._headers_buffer.append(far_future_headers() if self._versioned
+                                        else REVALIDATE_HEADERS)
+        else:
+            # Prevent caching of the HTML shell
+            self._headers_buffer.append(NO_CACHE_HEADERS)
         return super().end_headers()
 
-def run_server(port=8000):
+
+class FrontendHTTPServer(ThreadingHTTPServer):
+    """Thread-per-connection server so one slow client can't block the rest"""
+    
+    daemon_threads = True
+    allow_reuse_address = True
+    # Set by run_server() in pre-fork mode; a lone server must get EADDRINUSE
+    # from a stale instance instead of silently splitting traffic with it
+    reuse_port = False
+    
+    def server_bind(self):
+        # Let the pre-forked workers share the port
+        if self.reuse_port and hasattr(socket, 'SO_REUSEPORT'):
+            try:
+                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            except OSError:
+                pass
+        super().server_bind()
+    
+    def get_request(self):
+        request, client_address = super().get_request()
+        try:
+            # Disable Nagle for small responses; larger send buffer for assets
+            request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            request.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_SIZE)
+        except OSError:
+            pass
+        return request, client_address
+
+
+class DualStackHTTPServer(FrontendHTTPServer):
+    """IPv6 listener that also accepts IPv4 clients as ::ffff:a.b.c.d"""
+    
+    address_family = socket.AF_INET6
+    
+    def server_bind(self):
+        # Clear IPV6_V6ONLY before bind; its default depends on net.ipv6.bindv6only
+        try:
+            self.socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
+        except (AttributeError, OSError):
+            pass
+        super().server_bind()
+
+
+def make_server(host, port, handler):
+    """Bind the frontend server: '::' dual-stack for the default host, IPv4 if IPv6 is unavailable"""
+    if not host:
+        if socket.has_dualstack_ipv6():
+            return DualStackHTTPServer(('::', port), handler)
+        host = '0.0.0.0'
+    server_class = DualStackHTTPServer if ':' in host else FrontendHTTPServer
+    return server_class((host, port), handler)
+
+
+def write_banner(port, root, workers=1, mode=None):
+    """Print the startup banner in a single write"""
+    sys.stdout.write(
+        f"\n{'='*70}\n"
+        f"Frontend Server Running\n"
+        f"{'='*70}\n"
+        f"\n📱 Open browser: http://localhost:{port}\n"
+        f"📂 Serving files from: {root}\n"
+        + (f"⚙️  Server: {mode}\n" if mode else "")
+        + (f"👷 Worker processes: {workers}\n" if workers > 1 else "") +
+        f"\n✅ Backend API: http://localhost:5000\n"
+        f"✅ Spark UI: http://localhost:4040\n"
+        f"\n🛑 Press Ctrl+C to stop\n\n"
+        f"{'='*70}\n\n"
+    )
+    sys.stdout.flush()
+
+
+def serve_prefork(httpd, host, port, handler, workers):
+    """Fork workers: the first serves the already-bound httpd, the rest bind SO_REUSEPORT siblings"""
+    # Turn SIGTERM into a clean exit so the workers are reaped below
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    children = set()
+    failed = False
+    try:
+        for worker in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                # Child: own listening socket, own interpreter and GIL
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                status = 0
+                try:
+                    if worker:
+                        httpd.server_close()
+                        httpd = make_server(host, port, handler)
+                    httpd.serve_forever()
+                except KeyboardInterrupt:
+                    pass
+                except OSError as e:
+                    sys.stderr.write(f"Worker {os.getpid()} failed: {e}\n")
+                    status = 1
+                except BaseException:
+                    # os._exit below skips the interpreter's own traceback report
+                    traceback.print_exc()
+                    status = 1
+                finally:
+                    os._exit(status)
+            children.add(pid)
+        # The parent only supervises; its copy of the listener is not needed
+        httpd.server_close()
+        
+        # A worker that dies with a non-zero status takes the whole server down,
+        # so a service manager sees the failure instead of a clean exit
+        while children:
+            pid, status = os.wait()
+            children.discard(pid)
+            code = os.waitstatus_to_exitcode(status)
+            if code != 0:
+                sys.stderr.write(f"Worker {pid} exited with status {code}; stopping server\n")
+                failed = True
+                break
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+    
+    if failed:
+        sys.exit(1)
+
+
+def run_server(port=PORT, host=HOST, verbose=VERBOSE, workers=WORKERS):
     """Run the HTTP server"""
-    server_address = ('', port)
-    httpd = HTTPServer(server_address, MyHTTPRequestHandler)
-    
-    print(f"\n{'='*70}")
-    print(f"Frontend Server Running")
-    print(f"{'='*70}")
-    print(f"\n📱 Open browser: http://localhost:{port}")
-    print(f"📂 Serving files from: {os.getcwd()}")
-    print(f"\n✅ Backend API: http://localhost:5000")
-    print(f"✅ Spark UI: http://localhost:4040")
-    print(f"\n🛑 Press Ctrl+C to stop\n")
-    print(f"{'='*70}\n")
+    # Resolve the document root once instead of os.getcwd() per connection
+    root = os.path.abspath(os.getcwd())
+    
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    if workers > 1 and not (hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')):
+        sys.stdout.write("Pre-fork workers need os.fork and SO_REUSEPORT; running one process\n")
+        workers = 1
+    
+    MyHTTPRequestHandler.verbose = verbose
+    handler = partial(MyHTTPRequestHandler, directory=root)
+    # Bind before the banner so a taken port fails loudly in either mode;
+    # extra pre-fork workers share the port with SO_REUSEPORT
+    FrontendHTTPServer.reuse_port = workers > 1
+    httpd = make_server(host, port, handler)
+    
+    # Preload static assets so GETs are answered from memory (shared by forked workers)
+    ASSETS.clear()
+    ASSETS.update(load_assets(root))
+    
+    write_banner(port, root, workers)
     
     try:
-        httpd.serve_forever()
+        if workers == 1:
+            httpd.serve_forever()
+        else:
+            serve_prefork(httpd, host, port, handler, workers)
     except KeyboardInterrupt:
         print("\n\n🛑 Server stopped")
         sys.exit(0)
 
+def build_asgi_app(root):
+    """Starlette StaticFiles app wrapped with per-extension cache headers"""
+    from starlette.applications import Starlette
+    from starlette.routing import Mount
+    from starlette.staticfiles import StaticFiles
+    
+    # Mounted in a Starlette app so missing files become 404 responses
+    static = Starlette(routes=[Mount('/', app=StaticFiles(directory=root, html=True))])
+    no_cache = [(b'cache-control', b'no-store, no-cache, must-revalidate, max-age=0'),
+                (b'pragma', b'no-cache'),
+                (b'expires', b'0')]
+    
+    async def app(scope, receive, send):
+        if scope['type'] != 'http':
+            return await static(scope, receive, send)
+        
+        cacheable = not DEV_MODE and scope['path'].lower().endswith(CACHEABLE_EXTENSIONS)
+        
+        async def send_with_cache_headers(message):
+            if message['type'] == 'http.response.start':
+                headers = list(message.get('headers', []))
+                if cacheable and message['status'] in (200, 304):
+                    # index.html is served as-is here (no ?v= rewriting), so assets
+                    # only get the short max-age and revalidate via StaticFiles' ETag
+                    headers.append((b'cache-control',
+                                    f'public, max-age={REVALIDATE_MAX_AGE}'.encode()))
+                else:
+                    headers.extend(no_cache)
+                message = {**message, 'headers': headers}
+            await send(message)
+        
+        await static(scope, receive, send_with_cache_headers)
+    
+    return app
+
+
+def run_asgi_server(port=PORT, host=HOST, verbose=VERBOSE):
+    """Run the frontend on uvicorn + Starlette (optional: pip install uvicorn starlette)"""
+    try:
+        import uvicorn
+        app = build_asgi_app(os.path.abspath(os.getcwd()))
+    except ImportError as e:
+        sys.stderr.write(f"--asgi needs uvicorn and starlette installed ({e})\n")
+        sys.exit(1)
+    
+    # asyncio binds '::' IPv6-only, so hand uvicorn a prebound dual-stack socket
+    sockets = None
+    if not host:
+        if socket.has_dualstack_ipv6():
+            sockets = [socket.create_server(('::', port), family=socket.AF_INET6,
+                                            dualstack_ipv6=True)]
+        host = '::' if sockets else '0.0.0.0'
+    
+    write_banner(port, os.path.abspath(os.getcwd()), mode='uvicorn (ASGI)')
+    # 'auto' picks uvloop and httptools when they are installed
+    config = uvicorn.Config(app, host=host, port=port, loop='auto', http='auto',
+                            access_log=verbose, log_level='info' if verbose else 'warning')
+    uvicorn.Server(config).run(sockets=sockets)
+
+
 if __name__ == '__main__':
-    run_server(8000)
+    parser = argparse.ArgumentParser(description='Serve the dashboard frontend')
+    parser.add_argument('--port', type=int, default=PORT,
+                        help='port to listen on (default: $PORT or 8000)')
+    parser.add_argument('--host', default=HOST,
+                        help='address to bind (default: $FRONTEND_HOST or all interfaces, IPv6 + IPv4)')
+    parser.add_argument('--verbose', action='store_true',
+                        help='log every request (same as FRONTEND_LOG=1)')
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help='pre-forked server processes, 0 = one per CPU (POSIX only)')
+    parser.add_argument('--asgi', action='store_true',
+                        help='serve with uvicorn + Starlette StaticFiles instead of http.server')
+    parser.add_argument('--precompress', action='store_true',
+                        help='write .gz/.br files next to compressible assets and exit')
+    args = parser.parse_args()
+    
+    if args.precompress:
+        precompress_assets(os.path.abspath(os.getcwd()))
+        sys.exit(0)
+    
+    if args.asgi:
+        run_asgi_server(args.port, args.host, verbose=args.verbose or VERBOSE)
+    else:
+        run_server(args.port, args.host, verbose=args.verbose or VERBOSE, workers=args.workers)